@@ -1,7 +1,50 @@
 import os
-from dotenv import load_dotenv
+import re
+
+import constants as ct
+
+DOTENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+
+def load_dotenv(path: str = DOTENV_FILE) -> None:
+    """
+    Load KEY=VALUE lines from a .env file into os.environ.
+
+    Blank lines, comments and lines without a valid key are skipped,
+    quotes or an inline " #" comment are stripped from values, and
+    variables already set in the environment are not overridden.
+
+    Args:
+        path (str): Path of the .env file.
+    """
+    try:
+        with open(path, "r", encoding=ct.DEFAULT_ENCODING) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("export "):
+                    line = line[len("export "):]
+                k, sep, v = line.partition("=")
+                k = k.strip()
+                if not sep or not k:
+                    continue
+                v = v.strip()
+                end = v.find(v[0], 1) if v[:1] in ("\"", "'") else -1
+                if end != -1:
+                    v = v[1:end]
+                else:
+                    v = re.split(r"\s+#", v, maxsplit=1)[0]
+                try:
+                    os.environ.setdefault(k, v)
+                except (ValueError, OSError):
+                    continue
+    except FileNotFoundError:
+        pass
+
 
 load_dotenv()
+_ENV = dict(os.environ)
  
 class Config:
     EMAIL = "EMAIL"
@@ -12,15 +55,20 @@ class Config:
     REGION = "REGION"
     CW_NAMESPACE = "CW_NAMESPACE"
     VOL = "VOL"
+    REQUIRED = (
+        EMAIL, PASSWORD, USER_POOL_ID, IDENTITY_POOL_ID,
+        CLIENT_ID, REGION, CW_NAMESPACE, VOL
+    )
     def __init__(self):
-        self.email = os.getenv(Config.EMAIL)
-        self.password = os.getenv(Config.PASSWORD)
-        self.user_pool_id = os.getenv(Config.USER_POOL_ID)
-        self.identity_pool_id = os.getenv(Config.IDENTITY_POOL_ID)
-        self.client_id = os.getenv(Config.CLIENT_ID)
-        self.region = os.getenv(Config.REGION)
-        self.cw_namespace = os.getenv(Config.CW_NAMESPACE)
-        self.vol = os.getenv(Config.VOL)
-        missing = [k for k, v in self.__dict__.items() if v is None]
+        self.email = _ENV.get(Config.EMAIL)
+        self.password = _ENV.get(Config.PASSWORD)
+        self.user_pool_id = _ENV.get(Config.USER_POOL_ID)
+        self.identity_pool_id = _ENV.get(Config.IDENTITY_POOL_ID)
+        self.client_id = _ENV.get(Config.CLIENT_ID)
+        self.region = _ENV.get(Config.REGION)
+        self.cw_namespace = _ENV.get(Config.CW_NAMESPACE)
+        self.vol = _ENV.get(Config.VOL)
+        missing = [k for k in Config.REQUIRED if _ENV.get(k) is None]
         if missing:
             raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+        self.login_provider = f"{ct.COGNITO_PROVIDER}{self.user_pool_id}"
@@ -29,8 +29,22 @@ CLOUDWATCH = "cloudwatch"
 ACCESS_KEY_ID = "AccessKeyId"
 SECRET_KEY = "SecretKey"
 SESSION_TOKEN = "SessionToken"
+MAX_METRIC_DATA_PER_CALL = 1000
+SEND_INTERVAL = 300
+CPU_SAMPLE_INTERVAL = 1
+CREDENTIALS_EXPIRATION_SKEW = 60
+CREDENTIALS_REFRESH_SKEW = CREDENTIALS_EXPIRATION_SKEW + 2 * SEND_INTERVAL
 
 #Names
 metric_name_disk_usage = "DiskUsage"
 root_name_value = "/"
 metric_name_uptime = "Uptime"
+metric_name_cpu_usage = "CPUUsage"
+metric_name_memory_usage = "MemoryUsage"
+
+METRIC_UNITS = {
+    metric_name_disk_usage: UNIT_PERCENT,
+    metric_name_uptime: UNIT_SECONDS,
+    metric_name_cpu_usage: UNIT_PERCENT,
+    metric_name_memory_usage: UNIT_PERCENT
+}
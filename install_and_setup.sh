@@ -1,13 +1,14 @@
 #!/bin/bash -e
 
-# Requirements: cron, Python and pip with access to:
-# boto3, psutil, pytz, python-dotenv
+# Requirements: systemd, sudo, Python and pip with access to:
+# botocore, orjson, psutil
 
 # Variables
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PYTHON_SCRIPT="$SCRIPT_DIR/main.py"
-LOG_FILE="$SCRIPT_DIR/cron.log"
 SOURCE_PY="$(which python3)"
+SERVICE_NAME="metric-collector"
+SERVICE_FILE="/etc/systemd/system/$SERVICE_NAME.service"
 
 echo "🐍 Python version: $("$SOURCE_PY" --version)"
 
@@ -20,7 +21,7 @@ else
 fi
 
 echo "🔧 Installing dependencies..."
-"$SOURCE_PY" -m pip install --user boto3 psutil pytz python-dotenv
+"$SOURCE_PY" -m pip install --user botocore orjson psutil
 
 # Check that the Python script exists
 if [ ! -f "$PYTHON_SCRIPT" ]; then
@@ -28,9 +29,33 @@ if [ ! -f "$PYTHON_SCRIPT" ]; then
   exit 1
 fi
 
-echo "🕒 Setting up cron to run every 5 minutes..."
+# Clean previous cron entries, the service replaces them
+if command -v crontab > /dev/null 2>&1; then
+  ( (crontab -l 2>/dev/null || true) | grep -v "$PYTHON_SCRIPT" || true ) | crontab -
+fi
+
+echo "🕒 Setting up systemd service $SERVICE_NAME..."
+
+sudo tee "$SERVICE_FILE" > /dev/null <<UNIT
+[Unit]
+Description=Metric collector for AWS CloudWatch
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+User=$(id -un)
+WorkingDirectory=$SCRIPT_DIR
+ExecStart=$SOURCE_PY -u $PYTHON_SCRIPT
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+UNIT
 
-# Clean previous entries and add a new one
-( (crontab -l 2>/dev/null || true) | grep -v "$PYTHON_SCRIPT" ; echo "*/5 * * * * $SOURCE_PY $PYTHON_SCRIPT > $LOG_FILE 2>&1" ) | crontab -
+sudo systemctl daemon-reload
+sudo systemctl enable "$SERVICE_NAME"
+sudo systemctl restart "$SERVICE_NAME"
 
-echo "✅ Done. The script will run every 5 minutes."
+echo "✅ Done. The service will send metrics every 5 minutes."
+echo "📜 Logs: journalctl -u $SERVICE_NAME"
@@ -1,76 +1,116 @@
+import sys
 import time
-import json
-from datetime import datetime, timezone
-from typing import Callable, Dict, Any
-
-import boto3
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, Any, Optional
+
+import botocore.session
+import orjson
 import psutil
-import pytz
 
 import constants as ct
 from config import Config
 
 
-class CognitoCredentialError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
+class MetricPusherError(Exception):
+    pass
+
+class CognitoCredentialError(MetricPusherError):
+    pass
+
+class CreateCognitoclientError(MetricPusherError):
+    pass
+
+class CollectMetricsError(MetricPusherError):
+    pass
 
-class CreateCognitoclientError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
+class BuildMetricError(MetricPusherError):
+    pass
 
-class GetDiskUsageError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
+class SendMetricError(MetricPusherError):
+    pass
 
-class BuildMetricError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
+class SaveCredentialsError(MetricPusherError):
+    pass
 
-class SendMetricError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
 
-class SaveCredentialsError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = message
+_CREDS_CACHE: Optional[Dict[str, Any]] = None
+_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+_REFRESH_FUTURE: Optional[Future] = None
+_SESSION_LOCK = threading.Lock()
 
 
-def get_disk_usage(vol: str) -> float:
+@functools.lru_cache(maxsize=1)
+def _botocore_session() -> botocore.session.Session:
     """
-    Get the disk usage percentage of the root directory vol.
+    Get the botocore session shared by all clients of this process.
+    """
+    return botocore.session.Session()
 
-    Returns:
-        float: Disk usage as a percentage.
+
+@functools.lru_cache(maxsize=4)
+def _cw_client(
+    aws_access_key_id: str,
+    aws_secret_access_key: str,
+    aws_session_token: str,
+    region_name: str
+):
     """
-    try:
-        return psutil.disk_usage(vol).percent
-    except Exception as e:
-        raise GetDiskUsageError(f"Failed to retrieve disk usage: {str(e)}")
+    Get a CloudWatch client, cached per credentials and region.
+    """
+    with _SESSION_LOCK:
+        return _botocore_session().create_client(
+            ct.CLOUDWATCH,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token,
+            region_name=region_name
+        )
+
+
+@functools.lru_cache(maxsize=4)
+def _cognito_client(service_name: str, region_name: str):
+    """
+    Get an unauthenticated Cognito client, cached per service and region.
+    """
+    with _SESSION_LOCK:
+        return _botocore_session().create_client(
+            service_name,
+            region_name=region_name
+        )
 
-def get_uptime_metric():
+
+def collect_all(vol: str, cpu_interval: Optional[float] = None) -> Dict[str, float]:
     """
-    Get the UpTime of this machine.
+    Collect all host metrics in a single pass.
+
+    Args:
+        vol (str): Volume to report disk usage for.
+        cpu_interval (Optional[float]): Seconds to sample CPU usage over,
+            None to measure since the previous call.
 
     Returns:
-        float: UpTime in seconds
+        Dict[str, float]: Metric values keyed by metric name.
     """
-    boot_time = psutil.boot_time()
-    now = time.time()
-    uptime_seconds = now - boot_time
-    uptime_minutes = uptime_seconds
-    return uptime_minutes
+    try:
+        return {
+            ct.metric_name_disk_usage: psutil.disk_usage(vol).percent,
+            ct.metric_name_uptime: time.time() - psutil.boot_time(),
+            ct.metric_name_cpu_usage: psutil.cpu_percent(interval=cpu_interval),
+            ct.metric_name_memory_usage: psutil.virtual_memory().percent
+        }
+    except Exception as e:
+        raise CollectMetricsError(f"Failed to collect metrics: {str(e)}")
 
 def build_metric_data(
     metric_name: str, 
     value: float,
-    unit: str
+    unit: str,
+    dimension_value: str,
+    ts: datetime
 ) -> Dict[str, Any]:
     """
     Build a dictionary with metric data formatted for CloudWatch.
@@ -79,6 +119,8 @@ def build_metric_data(
         metric_name (str): Name of the metric.
         value (float): Metric value.
         unit (str): Unit of the metric.
+        dimension_value (str): Value of the metric dimension.
+        ts (datetime): Timestamp of the metric.
 
     Returns:
         Dict[str, Any]: Metric data dictionary.
@@ -86,9 +128,15 @@ def build_metric_data(
     try:
         return {
             ct.KEY_METRIC_NAME: metric_name,
-            ct.KEY_TIMESTAMP: datetime.now(pytz.UTC),
+            ct.KEY_TIMESTAMP: ts,
             ct.KEY_VALUE: value,
-            ct.KEY_UNIT: unit
+            ct.KEY_UNIT: unit,
+            ct.KEY_DIMENSIONS: [
+                {
+                    ct.KEY_NAME: metric_name,
+                    ct.KEY_VALUE: dimension_value
+                }
+            ]
         }
     except Exception as e:
         raise BuildMetricError(f"Failed to build metric: {str(e)}")
@@ -98,24 +146,38 @@ def put_metrics(
     aws_access_key_id: str,
     aws_secret_access_key: str,
     aws_session_token: str,
-    metric_data: list,
+    metrics: Dict[str, float],
+    dimension_values: Dict[str, str],
     cw_namespace: str,
     region_name: str
 ) -> None:
     """
-    Collect metric using a callable and send it to CloudWatch.
+    Send collected metrics to CloudWatch, batching up to
+    MAX_METRIC_DATA_PER_CALL datums per request.
 
     Args:
         aws_access_key_id (str): AWS access key ID.
         aws_secret_access_key (str): AWS secret access key.
         aws_session_token (str): AWS session token.
-        metric_collector (Callable[[], float]): Function to collect metric.
-        instance_name (str): Name of the instance sending metrics.
+        metrics (Dict[str, float]): Metric values keyed by metric name.
+        dimension_values (Dict[str, str]): Dimension value per metric name,
+            metrics not listed use their own name.
+        cw_namespace (str): CloudWatch namespace.
         region_name (str): AWS region name.
     """
+    ts = datetime.now(timezone.utc)
+    metric_data = [
+        build_metric_data(
+            metric_name=metric_name,
+            value=value,
+            unit=ct.METRIC_UNITS[metric_name],
+            dimension_value=dimension_values.get(metric_name, metric_name),
+            ts=ts
+        )
+        for metric_name, value in metrics.items()
+    ]
     try:
-        cw = boto3.client(
-            ct.CLOUDWATCH,
+        cw = _cw_client(
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
@@ -124,10 +186,12 @@ def put_metrics(
     except Exception as e:
         raise CreateCognitoclientError(f"Failed to create CloudWatch client: {str(e)}")
     try:
-        cw.put_metric_data(
-            Namespace=cw_namespace,
-            MetricData=metric_data
-        )
+        it = iter(metric_data)
+        while chunk := list(islice(it, ct.MAX_METRIC_DATA_PER_CALL)):
+            cw.put_metric_data(
+                Namespace=cw_namespace,
+                MetricData=chunk
+            )
     except Exception as e:
         raise SendMetricError(f"Failed to send metric: {str(e)}")
 
@@ -135,156 +199,233 @@ def put_metrics(
 def get_cognito_credentials(
     email: str,
     password: str,
-    user_pool_id: str,
+    login_provider: str,
     identity_pool_id: str,
     client_id: str,
     region: str
-) -> Dict[str, str]:
+) -> Dict[str, Any]:
     """
     Authenticate against Cognito and get temporary AWS credentials.
 
     Args:
         username (str): Cognito user name.
         password (str): Cognito user password.
-        user_pool_id (str): Cognito user pool ID.
+        login_provider (str): Cognito user pool login provider name.
         identity_pool_id (str): Cognito identity pool ID.
         client_id (str): Cognito client app ID.
         region (str): AWS region.
 
     Returns:
-        Dict[str, str]: Dictionary with AWS temporary credentials
+        Dict[str, Any]: Dictionary with AWS temporary credentials
         and expiration of credentials.
     """
     try:
-        idp = boto3.client(ct.COGNITO_IDP, region_name=region)
-        resp = idp.initiate_auth(
-            AuthFlow=ct.USER_PASSWORD_AUTH,
-            AuthParameters={
-                ct.KEY_USERNAME: email,
-                ct.KEY_PASSWORD: password,
-            },
-            ClientId=client_id
-        )
-        id_token = resp[ct.KEY_AUTH_RESULTS][ct.KEY_ID_TOKEN]
-        identity = boto3.client(ct.COGNITO_IDENTITY, region_name=region)
+        idp = _cognito_client(ct.COGNITO_IDP, region_name=region)
+        # Build the identity client while initiate_auth is in flight
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            identity_future = executor.submit(
+                _cognito_client, ct.COGNITO_IDENTITY, region_name=region
+            )
+            resp = idp.initiate_auth(
+                AuthFlow=ct.USER_PASSWORD_AUTH,
+                AuthParameters={
+                    ct.KEY_USERNAME: email,
+                    ct.KEY_PASSWORD: password,
+                },
+                ClientId=client_id
+            )
+            identity = identity_future.result()
+        logins = {login_provider: resp[ct.KEY_AUTH_RESULTS][ct.KEY_ID_TOKEN]}
         identity_id = identity.get_id(
             IdentityPoolId=identity_pool_id,
-            Logins={ct.COGNITO_PROVIDER + user_pool_id: id_token}
+            Logins=logins
         )[ct.KEY_IDENTITY_ID]
         creds = identity.get_credentials_for_identity(
             IdentityId=identity_id,
-            Logins={ct.COGNITO_PROVIDER + user_pool_id: id_token}
+            Logins=logins
         )[ct.KEY_CREDENTIALS]
-        expiration_dt = creds[ct.EXPIRATION].astimezone(timezone.utc)
-        expiration_iso = expiration_dt.isoformat()
         return {
             ct.ACCESS_KEY_ID: creds[ct.ACCESS_KEY_ID],
             ct.SECRET_KEY: creds[ct.SECRET_KEY],
             ct.SESSION_TOKEN: creds[ct.SESSION_TOKEN],
-            ct.EXPIRATION: expiration_iso
+            ct.EXPIRATION: creds[ct.EXPIRATION].astimezone(timezone.utc)
         }
     except Exception as e:
         raise CognitoCredentialError(f"Failed to get Cognito credentials: {str(e)}")
 
 
 def save_credentials(
-    creds: Dict[str, str],
-    credentials_file: str,
-    encoding: str
+    creds: Dict[str, Any],
+    credentials_file: str
 ) -> None:
     """
-    Save credentials dictionary as JSON to a file.
+    Save credentials dictionary as UTF-8 JSON to a file.
 
     Args:
-        creds (Dict[str, str]): Credentials data to save.
+        creds (Dict[str, Any]): Credentials data to save.
         credentials_file (str): File path to save credentials.
-        encoding (str): File encoding.
     """
     try:
-        with open(credentials_file, "w", encoding=encoding) as f:
-            json.dump(creds, f, ensure_ascii=False, indent=4)
+        with open(credentials_file, "wb") as f:
+            f.write(orjson.dumps(creds, option=orjson.OPT_INDENT_2))
     except Exception as e:
         raise SaveCredentialsError(f"Failed to save new credentials: {str(e)}")
 
 
-def load_credentials(now_utc: datetime):
+def credentials_expired(creds: Dict[str, Any], now_utc: datetime) -> bool:
+    """
+    Check whether credentials are expired or about to expire.
+
+    Args:
+        creds (Dict[str, Any]): Credentials data.
+        now_utc (datetime): Current UTC time.
+
+    Returns:
+        bool: True if credentials expire within CREDENTIALS_EXPIRATION_SKEW.
+    """
+    skew = timedelta(seconds=ct.CREDENTIALS_EXPIRATION_SKEW)
+    return now_utc >= creds[ct.EXPIRATION] - skew
+
+
+def load_credentials(now_utc: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Get unexpired credentials, from memory if cached or else from
+    CREDENTIALS_FILE.
+
+    Args:
+        now_utc (datetime): Current UTC time.
+
+    Returns:
+        Dict[str, Any]: Credentials, or None if none are valid.
+    """
+    global _CREDS_CACHE
+    if _CREDS_CACHE is not None and not credentials_expired(_CREDS_CACHE, now_utc):
+        return _CREDS_CACHE
     try:
-        with open(ct.CREDENTIALS_FILE, "r", encoding=ct.DEFAULT_ENCODING) as f:
-            creds = json.load(f)
-            expiration_str = creds[ct.EXPIRATION]
-            expiration_dt = datetime.fromisoformat(expiration_str)
-            if now_utc < expiration_dt:
+        with open(ct.CREDENTIALS_FILE, "rb") as f:
+            creds = orjson.loads(f.read())
+            creds[ct.EXPIRATION] = datetime.fromisoformat(creds[ct.EXPIRATION])
+            if not credentials_expired(creds, now_utc):
+                _CREDS_CACHE = creds
                 return creds
-    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+    except (FileNotFoundError, KeyError, TypeError, ValueError):
         pass
     return None
 
 
-def main():
+def refresh_credentials(config: Config) -> Dict[str, Any]:
     """
-    Main entry point.
+    Authenticate to Cognito, then cache and save the new credentials.
+
+    Args:
+        config (Config): Collector configuration.
+
+    Returns:
+        Dict[str, Any]: New credentials.
+    """
+    global _CREDS_CACHE
+    creds = get_cognito_credentials(
+        email=config.email,
+        password=config.password,
+        login_provider=config.login_provider,
+        identity_pool_id=config.identity_pool_id,
+        client_id=config.client_id,
+        region=config.region
+    )
+    _CREDS_CACHE = creds
+    save_credentials(
+        creds=creds,
+        credentials_file=ct.CREDENTIALS_FILE
+    )
+    return creds
+
+
+def _report_refresh_error(future: Future) -> None:
+    """
+    Print the error of a failed background credentials refresh to stderr.
+    """
+    e = future.exception()
+    if e is not None:
+        print(str(e), file=sys.stderr)
 
-    Checks if saved credentials exist, are valid and not expired; 
-    if so, sends metrics using them, otherwise authenticates to Cognito,
-    sends metrics and saves new creds.
+
+def refresh_credentials_ahead(
+    config: Config,
+    creds: Dict[str, Any],
+    now_utc: datetime
+) -> None:
+    """
+    Start a background credentials refresh if creds expire within
+    CREDENTIALS_REFRESH_SKEW and no refresh is already running.
+
+    Args:
+        config (Config): Collector configuration.
+        creds (Dict[str, Any]): Credentials currently in use.
+        now_utc (datetime): Current UTC time.
+    """
+    global _REFRESH_FUTURE
+    if _REFRESH_FUTURE is not None and not _REFRESH_FUTURE.done():
+        return
+    skew = timedelta(seconds=ct.CREDENTIALS_REFRESH_SKEW)
+    if now_utc >= creds[ct.EXPIRATION] - skew:
+        _REFRESH_FUTURE = _REFRESH_EXECUTOR.submit(refresh_credentials, config)
+        _REFRESH_FUTURE.add_done_callback(_report_refresh_error)
+
+
+def collect_and_send(config: Config, cpu_interval: Optional[float] = None) -> None:
+    """
+    Collect metrics and send them to CloudWatch once.
+
+    Uses cached or saved credentials while they are valid, refreshing
+    them in the background shortly before they expire; otherwise waits
+    for a running refresh or authenticates to Cognito.
+
+    Args:
+        config (Config): Collector configuration.
+        cpu_interval (Optional[float]): Seconds to sample CPU usage over,
+            None to measure since the previous run.
     """
     now_utc = datetime.now(timezone.utc)
     creds = load_credentials(now_utc=now_utc)
-    config = Config()
-    metric_data = [
-        {
-            ct.KEY_METRIC_NAME: ct.metric_name_disk_usage,
-            ct.KEY_TIMESTAMP: datetime.now(pytz.UTC),
-            ct.KEY_VALUE: get_disk_usage(vol=config.vol),
-            ct.KEY_UNIT: ct.UNIT_PERCENT,
-            ct.KEY_DIMENSIONS: [
-                {
-                    ct.KEY_NAME: ct.metric_name_disk_usage,
-                    ct.KEY_VALUE: config.vol
-                }
-            ]
-        },
-        {
-            ct.KEY_METRIC_NAME: ct.metric_name_uptime,
-            ct.KEY_TIMESTAMP: datetime.now(pytz.UTC),
-            ct.KEY_VALUE: get_uptime_metric(),
-            ct.KEY_UNIT: ct.UNIT_SECONDS,
-            ct.KEY_DIMENSIONS: [
-                {
-                    ct.KEY_NAME: ct.metric_name_uptime,
-                    ct.KEY_VALUE: ct.metric_name_uptime
-                }
-            ]
-        }
-    ]
-    if creds is not None:
-        put_metrics(
-            aws_access_key_id=creds[ct.ACCESS_KEY_ID],
-            aws_secret_access_key=creds[ct.SECRET_KEY],
-            aws_session_token=creds[ct.SESSION_TOKEN],
-            metric_data=metric_data,
-            cw_namespace=config.cw_namespace,
-            region_name=config.region
-        )
+    if creds is None and _REFRESH_FUTURE is not None and not _REFRESH_FUTURE.done():
+        try:
+            _REFRESH_FUTURE.result()
+        except MetricPusherError:
+            pass
+        creds = load_credentials(now_utc=now_utc)
+    if creds is None:
+        creds = refresh_credentials(config)
     else:
-        creds = get_cognito_credentials(
-            email=config.email,
-            password=config.password,
-            user_pool_id=config.user_pool_id,
-            identity_pool_id=config.identity_pool_id,
-            client_id=config.client_id,
-            region=config.region
-        )
-        save_credentials(
-            creds=creds,
-            credentials_file=ct.CREDENTIALS_FILE,
-            encoding=ct.DEFAULT_ENCODING
-        )
-        put_metrics(
-            aws_access_key_id=creds[ct.ACCESS_KEY_ID],
-            aws_secret_access_key=creds[ct.SECRET_KEY],
-            aws_session_token=creds[ct.SESSION_TOKEN],
-            metric_data=metric_data,
-            cw_namespace=config.cw_namespace,
-            region_name=config.region
-        )
+        refresh_credentials_ahead(config, creds, now_utc)
+    put_metrics(
+        aws_access_key_id=creds[ct.ACCESS_KEY_ID],
+        aws_secret_access_key=creds[ct.SECRET_KEY],
+        aws_session_token=creds[ct.SESSION_TOKEN],
+        metrics=collect_all(vol=config.vol, cpu_interval=cpu_interval),
+        dimension_values={ct.metric_name_disk_usage: config.vol},
+        cw_namespace=config.cw_namespace,
+        region_name=config.region
+    )
+
+
+def main():
+    """
+    Main entry point.
+
+    Sends metrics every SEND_INTERVAL seconds, keeping clients and
+    credentials cached in memory between runs. Errors in a single run are
+    reported and the next run is still scheduled.
+    """
+    config = Config()
+    # No previous cpu_percent call to measure from, so sample the first run
+    cpu_interval = ct.CPU_SAMPLE_INTERVAL
+    next_run = time.monotonic()
+    while True:
+        try:
+            collect_and_send(config=config, cpu_interval=cpu_interval)
+            cpu_interval = None
+        except MetricPusherError as e:
+            print(str(e), file=sys.stderr)
+        # Skip slots missed by a stalled run instead of running them back to back
+        next_run = max(next_run + ct.SEND_INTERVAL, time.monotonic())
+        time.sleep(max(0.0, next_run - time.monotonic()))